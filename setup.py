@@ -4,12 +4,18 @@ setup(
     name="kraken_auto",
     version="0.1",
     packages=find_packages(),
+    python_requires='>=3.10',
     install_requires=[
         'ccxt>=4.0.0',
+        'aiohttp>=3.9.0',
+        'certifi',
         'pandas>=2.0.0',
+        'numba>=0.60.0',
+        'orjson>=3.9.0',
         'pyyaml>=6.0.0',
         'python-dotenv>=1.0.0',
         'pytest>=7.0.0',
-        'pytest-asyncio>=0.21.0'
+        'pytest-asyncio>=0.26.0',
+        'pytest-xdist>=3.0.0'
     ]
 )
\ No newline at end of file
@@ -1,3 +1,4 @@
 from .kraken_client import KrakenClient
+from .rate_limiter import AdaptiveRateLimiter
 
-__all__ = ['KrakenClient']
\ No newline at end of file
+__all__ = ['KrakenClient', 'AdaptiveRateLimiter']
\ No newline at end of file
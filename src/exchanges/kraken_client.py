@@ -1,17 +1,32 @@
-import ccxt
+import ccxt.pro as ccxt
+import aiohttp
+import asyncio
+import certifi
 import logging
+import numpy as np
+import pandas as pd
 import os
-import json
-from typing import Dict, List, Optional
+import orjson
+import ssl
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple, Union
 from datetime import datetime
 from pathlib import Path
 
+from .rate_limiter import AdaptiveRateLimiter
+
+logger = logging.getLogger(__name__)
+
 class KrakenClient:
     """
     A wrapper class for interacting with the Kraken exchange using CCXT.
     Includes paper trading simulation capabilities.
     """
     
+    # Number of paper orders between balance snapshots
+    PAPER_SNAPSHOT_INTERVAL = 100
+    
     def __init__(self, api_key: str = None, api_secret: str = None, paper_trading: bool = True,
                  paper_balance: Dict[str, float] = None):
         """
@@ -23,15 +38,29 @@ class KrakenClient:
             paper_trading: If True, use paper trading simulation
             paper_balance: Initial paper trading balance (e.g., {'USD': 10000, 'BTC': 1})
         """
-        self.logger = logging.getLogger(__name__)
+        self.logger = logger
         self.paper_trading = paper_trading
         
-        # Initialize the CCXT Kraken exchange
+        # Initialize the CCXT Kraken exchange. REST spacing is handled by the
+        # adaptive rate limiter instead of ccxt's static per-exchange throttle.
         self.exchange = ccxt.kraken({
             'apiKey': api_key,
             'secret': api_secret,
-            'enableRateLimit': True
+            'enableRateLimit': False,
+            'aiohttp_trust_env': True
         })
+        self._http_session: Optional[aiohttp.ClientSession] = None
+        
+        # Public calls: 1 request per second, private calls: 3 second spacing
+        self._rate_limiter = AdaptiveRateLimiter({'public': 1.0, 'private': 3.0})
+        self._install_rate_limiter()
+        
+        # Rolling OHLCV buffers fed by websocket watchers, keyed by (symbol, timeframe)
+        self._ohlcv_buffer: Dict[Tuple[str, str], deque] = {}
+        self._ohlcv_watchers: Dict[Tuple[str, str], asyncio.Task] = {}
+        
+        # Trading pairs split into (base, quote), cached per symbol
+        self._symbol_parts: Dict[str, Tuple[str, str]] = {}
         
         # Setup paper trading
         if paper_trading:
@@ -39,6 +68,29 @@ class KrakenClient:
             self.paper_orders = []
             self._setup_paper_trading()
     
+    def _install_rate_limiter(self):
+        """Route the exchange's REST requests through the adaptive rate limiter"""
+        fetch2 = self.exchange.fetch2
+        
+        async def rate_limited_fetch2(path, api='public', method='GET', params={},
+                                      headers=None, body=None, config={}):
+            key = api if isinstance(api, str) else api[0]
+            attempt = 0
+            while True:
+                await self._rate_limiter.acquire(key)
+                try:
+                    response = await fetch2(path, api, method, params, headers, body, config)
+                except (ccxt.DDoSProtection, ccxt.RateLimitExceeded):
+                    if attempt >= self._rate_limiter.max_retries:
+                        raise
+                    await self._rate_limiter.backoff(key, attempt)
+                    attempt += 1
+                    continue
+                self._rate_limiter.update_from_headers(key, self.exchange.last_response_headers)
+                return response
+        
+        self.exchange.fetch2 = rate_limited_fetch2
+    
     def _setup_paper_trading(self):
         """Setup paper trading directory and state"""
         # Create all required directories
@@ -53,64 +105,254 @@ class KrakenClient:
             directory.mkdir(parents=True, exist_ok=True)
         
         self.state_file = Path('data/paper_trading_results/trading_state.json')
+        self.orders_log_file = Path('data/paper_trading_results/orders.jsonl')
+        
+        # Opened on the first order so a fresh session replaces the previous log
+        self._orders_log = None
+        self._paper_orders_by_id = {order['id']: order for order in self.paper_orders}
+        self._order_seq = len(self.paper_orders)
         
         # Initialize empty state file if it doesn't exist
         if not self.state_file.exists():
             self._save_paper_trading_state()
     
     def _load_paper_trading_state(self):
-        """Load paper trading state from file if it exists"""
+        """Load the balance snapshot and replay any orders logged after it"""
         try:
             if self.state_file.exists():
-                with open(self.state_file, 'r') as f:
-                    state = json.load(f)
-                    self.paper_balance = state.get('balance', self.paper_balance)
-                    self.paper_orders = state.get('orders', [])
-                self.logger.info("Loaded paper trading state")
+                state = orjson.loads(self.state_file.read_bytes())
+                self.paper_balance = state.get('balance', self.paper_balance)
+                snapshot_count = state.get('order_count', 0)
+                
+                orders = []
+                if self.orders_log_file.exists():
+                    lines = self.orders_log_file.read_bytes().splitlines()
+                    orders = [orjson.loads(line) for line in lines if line.strip()]
+                
+                for order in orders[snapshot_count:]:
+                    self._apply_paper_fill(order['symbol'], order['side'], order['amount'], order['price'])
+                self.paper_orders = orders
+                self._paper_orders_by_id = {order['id']: order for order in orders}
+                self._order_seq = len(orders)
+                
+                # Continue the loaded session's log rather than replacing it
+                if self._orders_log is None:
+                    self._orders_log = open(self.orders_log_file, 'ab', buffering=1 << 16)
+                self.logger.info(f"Loaded paper trading state ({len(orders) - snapshot_count} orders replayed)")
         except Exception as e:
             self.logger.error(f"Error loading paper trading state: {e}")
     
     def _save_paper_trading_state(self):
-        """Save paper trading state to file"""
+        """Atomically snapshot the paper balance and the number of logged orders it covers"""
         try:
-            with open(self.state_file, 'w') as f:
-                json.dump({
-                    'balance': self.paper_balance,
-                    'orders': self.paper_orders
-                }, f, indent=4)
+            # The snapshot must never be ahead of the order log on disk
+            if self._orders_log is not None:
+                self._orders_log.flush()
+            
+            tmp_file = self.state_file.with_suffix('.json.tmp')
+            tmp_file.write_bytes(orjson.dumps({
+                'balance': self.paper_balance,
+                'order_count': len(self.paper_orders)
+            }, option=orjson.OPT_SERIALIZE_NUMPY))
+            os.replace(tmp_file, self.state_file)
             self.logger.debug("Saved paper trading state")
         except Exception as e:
             self.logger.error(f"Error saving paper trading state: {e}")
+    
+    def _log_paper_order(self, order: Dict):
+        """Append an order to the order log, snapshotting the balance periodically"""
+        first_order = self._orders_log is None
+        if first_order:
+            self._orders_log = open(self.orders_log_file, 'wb', buffering=1 << 16)
+        self._orders_log.write(
+            orjson.dumps(order, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+        )
+        
+        if first_order or len(self.paper_orders) % self.PAPER_SNAPSHOT_INTERVAL == 0:
+            self._save_paper_trading_state()
+    
+    @staticmethod
+    def _paper_order_output(order: Dict) -> Dict:
+        """
+        Copy of a stored paper order as returned to callers. Records keep only
+        the integer millisecond 'timestamp'; the ISO 'datetime' that ccxt
+        orders carry is formatted here, when an order leaves the client.
+        """
+        return {**order, 'datetime': datetime.fromtimestamp(order['timestamp'] / 1000).isoformat()}
+
+    async def open(self):
+        """
+        Give the exchange a pooled HTTP session so concurrent requests reuse
+        kept-alive TCP/TLS connections. Must run inside the event loop.
+        """
+        if self._http_session is None:
+            connector = aiohttp.TCPConnector(
+                ssl=ssl.create_default_context(cafile=certifi.where()),
+                limit_per_host=64,
+                keepalive_timeout=60,
+                enable_cleanup_closed=True
+            )
+            self._http_session = aiohttp.ClientSession(connector=connector, trust_env=True)
+            self.exchange.session = self._http_session
+
+    async def close(self):
+        """
+        Stop market data streaming, release exchange connections and flush
+        paper trading state to disk.
+        """
+        for watcher in self._ohlcv_watchers.values():
+            watcher.cancel()
+        self._ohlcv_watchers.clear()
+        
+        try:
+            await self.exchange.close()
+        finally:
+            if self._http_session is not None:
+                await self._http_session.close()
+                self._http_session = None
+        
+        if self.paper_trading and self._orders_log is not None:
+            self._save_paper_trading_state()
+            self._orders_log.close()
+            self._orders_log = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
 
     async def fetch_market_data(self, symbol: str, timeframe: str = '1m', 
-                              limit: int = 100) -> List[Dict]:
+                              limit: int = 100,
+                              as_arrays: bool = False) -> Union[pd.DataFrame, Dict[str, np.ndarray]]:
+        """
+        Fetch OHLCV candles for a symbol as a DataFrame with one column per field,
+        or with `as_arrays` as a dict of contiguous column arrays that skips
+        DataFrame construction.
+        
+        Candles are served from a local rolling buffer that a websocket
+        subscription keeps up to date, so a warm call does no network round-trip.
+        The subscription is started on the first call for each symbol/timeframe.
+        The buffer is refilled over REST when it holds fewer than `limit` candles
+        or its newest candle is more than one timeframe old.
+        """
+        key = (symbol, timeframe)
+        buffer = self._ohlcv_buffer.get(key)
+        if buffer is None or buffer.maxlen < limit:
+            buffer = deque(buffer or (), maxlen=limit)
+            self._ohlcv_buffer[key] = buffer
+        
+        if key not in self._ohlcv_watchers:
+            self._ohlcv_watchers[key] = asyncio.create_task(self._ohlcv_watcher(symbol, timeframe))
+        
+        if self._is_buffer_stale(buffer, timeframe, limit):
+            await self._refill_ohlcv_buffer(symbol, timeframe, limit)
+        
+        candles = list(buffer)[-limit:]
+        if as_arrays:
+            return self._parse_ohlcv_columns(candles)
+        return self._parse_ohlcv(candles)
+
+    async def fetch_market_data_many(self, symbols: List[str], timeframe: str = '1m',
+                                     limit: int = 100) -> Dict[str, pd.DataFrame]:
+        """
+        Fetch OHLCV candles for several symbols concurrently.
+        
+        Requests are fanned out with asyncio.gather over the shared exchange
+        instance; the adaptive rate limiter still spaces the REST calls.
+        Symbols whose fetch fails are logged and left out of the result.
+        """
+        results = await asyncio.gather(
+            *(self.fetch_market_data(symbol, timeframe, limit) for symbol in symbols),
+            return_exceptions=True
+        )
+        
+        market_data = {}
+        for symbol, result in zip(symbols, results):
+            if isinstance(result, Exception):
+                self.logger.error(f"Error fetching market data for {symbol}: {str(result)}")
+                continue
+            market_data[symbol] = result
+        return market_data
+
+    @staticmethod
+    def _parse_ohlcv_columns(ohlcv: List[List]) -> Dict[str, np.ndarray]:
+        """Convert raw ccxt OHLCV rows into a dict of contiguous column arrays"""
+        # Transpose once so every column is its own contiguous buffer
+        cols = np.ascontiguousarray(np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6).T)
+        return {
+            'timestamp': cols[0].astype(np.int64),
+            'open': cols[1],
+            'high': cols[2],
+            'low': cols[3],
+            'close': cols[4],
+            'volume': cols[5]
+        }
+
+    @staticmethod
+    def _parse_ohlcv(ohlcv: List[List]) -> pd.DataFrame:
+        """Convert raw ccxt OHLCV rows into a columnar candle DataFrame"""
+        return pd.DataFrame(KrakenClient._parse_ohlcv_columns(ohlcv))
+
+    @staticmethod
+    def _is_buffer_stale(buffer: deque, timeframe: str, limit: int) -> bool:
+        """Check whether a candle buffer is too short or too old to serve from"""
+        if len(buffer) < limit:
+            return True
+        timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        return time.time() * 1000 - buffer[-1][0] > timeframe_ms
+
+    @staticmethod
+    def _merge_candles(buffer: deque, candles: List[List]):
+        """Merge streamed candles into a buffer, updating the in-progress bar in place"""
+        for candle in candles:
+            if buffer and candle[0] == buffer[-1][0]:
+                buffer[-1] = candle
+            elif not buffer or candle[0] > buffer[-1][0]:
+                buffer.append(candle)
+
+    async def _refill_ohlcv_buffer(self, symbol: str, timeframe: str, limit: int):
+        """Refill a candle buffer with a one-off REST request"""
         try:
             ohlcv = await self.exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
-            return [
-                {
-                    'timestamp': candle[0],
-                    'open': candle[1],
-                    'high': candle[2],
-                    'low': candle[3],
-                    'close': candle[4],
-                    'volume': candle[5]
-                }
-                for candle in ohlcv
-            ]
         except ccxt.NetworkError as e:
             self.logger.error(f"Network error fetching market data: {str(e)}")
             raise
         except ccxt.ExchangeError as e:
             self.logger.error(f"Exchange error fetching market data: {str(e)}")
             raise
+        
+        buffer = self._ohlcv_buffer[(symbol, timeframe)]
+        buffer.clear()
+        buffer.extend(ohlcv)
+
+    async def _ohlcv_watcher(self, symbol: str, timeframe: str):
+        """Stream candles for a symbol/timeframe into its rolling buffer"""
+        key = (symbol, timeframe)
+        while True:
+            try:
+                candles = await self.exchange.watch_ohlcv(symbol, timeframe)
+            except ccxt.NotSupported as e:
+                self.logger.warning(f"OHLCV streaming unavailable, using REST only: {str(e)}")
+                return
+            except (ccxt.NetworkError, ccxt.ExchangeError) as e:
+                self.logger.error(f"Error watching market data: {str(e)}")
+                await asyncio.sleep(1)
+                continue
+            self._merge_candles(self._ohlcv_buffer[key], candles)
 
     async def create_order(self, symbol: str, order_type: str, side: str, 
-                         amount: float, price: Optional[float] = None) -> Dict:
+                         amount: float, price: Optional[float] = None,
+                         last_price: Optional[float] = None) -> Dict:
         """
         Create a new order. Uses paper trading simulation if enabled.
+        
+        In paper trading, `last_price` (e.g. the close a signal was generated
+        from) fills market orders without fetching the ticker.
         """
         if self.paper_trading:
-            return await self._create_paper_order(symbol, order_type, side, amount, price)
+            return await self._create_paper_order(symbol, order_type, side, amount, price, last_price)
         
         try:
             params = {}
@@ -132,39 +374,26 @@ class KrakenClient:
             raise
 
     async def _create_paper_order(self, symbol: str, order_type: str, side: str,
-                                amount: float, price: Optional[float] = None) -> Dict:
+                                amount: float, price: Optional[float] = None,
+                                last_price: Optional[float] = None) -> Dict:
         """
         Simulate order creation for paper trading.
         """
         try:
-            ticker = await self.exchange.fetch_ticker(symbol)
-            execution_price = price if order_type == 'limit' else ticker['last']
-            
-            # Parse the trading pair
-            base, quote = symbol.split('/')
+            if order_type == 'limit':
+                execution_price = price
+            elif last_price is not None:
+                execution_price = last_price
+            else:
+                ticker = await self.exchange.fetch_ticker(symbol)
+                execution_price = ticker['last']
             
-            # Check if we have enough balance
-            if side == 'buy':
-                required_quote = amount * execution_price
-                if self.paper_balance.get(quote, 0) < required_quote:
-                    raise ValueError(f"Insufficient paper trading balance in {quote}")
-                
-                # Update paper balances
-                self.paper_balance[quote] = self.paper_balance.get(quote, 0) - required_quote
-                self.paper_balance[base] = self.paper_balance.get(base, 0) + amount
-            
-            else:  # sell
-                if self.paper_balance.get(base, 0) < amount:
-                    raise ValueError(f"Insufficient paper trading balance in {base}")
-                
-                # Update paper balances
-                self.paper_balance[base] = self.paper_balance.get(base, 0) - amount
-                self.paper_balance[quote] = self.paper_balance.get(quote, 0) + (amount * execution_price)
+            self._apply_paper_fill(symbol, side, amount, execution_price)
             
             # Create paper order record
             order = {
-                'id': f"paper_{len(self.paper_orders)}",
-                'datetime': datetime.now().isoformat(),
+                'id': f"paper_{self._order_seq}",
+                'timestamp': int(time.time() * 1000),
                 'symbol': symbol,
                 'type': order_type,
                 'side': side,
@@ -172,16 +401,52 @@ class KrakenClient:
                 'price': execution_price,
                 'status': 'closed'  # Paper orders are executed immediately
             }
+            self._order_seq += 1
             
             self.paper_orders.append(order)
-            self._save_paper_trading_state()
+            self._paper_orders_by_id[order['id']] = order
+            self._log_paper_order(order)
             
-            return order
+            return self._paper_order_output(order)
             
         except Exception as e:
             self.logger.error(f"Error in paper trading order: {str(e)}")
             raise
 
+    def _apply_paper_fill(self, symbol: str, side: str, amount: float, price: float):
+        """
+        Apply a filled paper order to the paper balances.
+        """
+        # Parse the trading pair (cached per symbol)
+        parts = self._symbol_parts.get(symbol)
+        if parts is None:
+            parts = self._symbol_parts[symbol] = tuple(symbol.split('/'))
+        base, quote = parts
+        
+        balance = self.paper_balance
+        base_balance = balance.get(base, 0)
+        quote_balance = balance.get(quote, 0)
+        
+        # Check if we have enough balance
+        if side == 'buy':
+            required_quote = amount * price
+            if quote_balance < required_quote:
+                raise ValueError(f"Insufficient paper trading balance in {quote}")
+            
+            quote_balance -= required_quote
+            base_balance += amount
+        
+        else:  # sell
+            if base_balance < amount:
+                raise ValueError(f"Insufficient paper trading balance in {base}")
+            
+            base_balance -= amount
+            quote_balance += amount * price
+        
+        # Update paper balances
+        balance[base] = base_balance
+        balance[quote] = quote_balance
+
     async def fetch_balance(self) -> Dict[str, float]:
         """
         Fetch account balances. Returns paper trading balance if enabled.
@@ -219,10 +484,10 @@ class KrakenClient:
         Fetch details of a specific order. Returns paper order if in paper trading mode.
         """
         if self.paper_trading:
-            order = next((order for order in self.paper_orders if order['id'] == order_id), None)
+            order = self._paper_orders_by_id.get(order_id)
             if order is None:
                 raise ValueError(f"Paper order {order_id} not found")
-            return order
+            return self._paper_order_output(order)
         
         try:
             return await self.exchange.fetch_order(order_id, symbol)
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+class AdaptiveRateLimiter:
+    """
+    Request spacing that adapts to the exchange's reported budget.
+
+    Each request class (e.g. Kraken's 'public' and 'private' APIs) gets its own
+    minimum interval between requests. Rate limit headers on responses tighten
+    or relax that interval, rate limit errors back off exponentially, and
+    successful requests ease the interval back to its base value.
+    """
+
+    def __init__(self, base_intervals: Dict[str, float], default_interval: float = 1.0,
+                 min_interval: float = 0.05, backoff_base: float = 1.0,
+                 max_backoff: float = 10.0, max_retries: int = 3):
+        """
+        Initialize the rate limiter.
+
+        Args:
+            base_intervals: Seconds between requests per request class when no
+                header information is available (e.g. {'public': 1.0, 'private': 3.0})
+            default_interval: Base interval for request classes not listed above
+            min_interval: Lower bound on the interval, whatever the headers report
+            backoff_base: Initial back-off delay after a rate limit error, in seconds
+            max_backoff: Maximum back-off delay in seconds
+            max_retries: Retries allowed for a request that hits a rate limit error
+        """
+        self.logger = logger
+        self.base_intervals = dict(base_intervals)
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.max_retries = max_retries
+
+        self._intervals: Dict[str, float] = {}
+        self._next_slot: Dict[str, float] = {}
+
+    def _base_interval(self, key: str) -> float:
+        return self.base_intervals.get(key, self.default_interval)
+
+    def interval(self, key: str) -> float:
+        """Current spacing in seconds between requests of a class"""
+        return self._intervals.get(key, self._base_interval(key))
+
+    async def acquire(self, key: str):
+        """
+        Wait for the next request slot of a class.
+
+        Slots are reserved before sleeping, so concurrent callers queue up
+        one interval apart instead of firing together.
+        """
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(key, now))
+        self._next_slot[key] = slot + self.interval(key)
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def update_from_headers(self, key: str, headers: Optional[Mapping[str, str]]):
+        """
+        Adjust the request spacing from response headers.
+
+        Understands `Retry-After` and the `X-RateLimit-Remaining` /
+        `X-RateLimit-Reset` pair. Without either, a successful response eases the
+        interval 10% of the way back toward its base value.
+        """
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        now = time.monotonic()
+
+        try:
+            retry_after = headers.get('retry-after')
+            if retry_after is not None:
+                self._next_slot[key] = max(self._next_slot.get(key, now), now + float(retry_after))
+                return
+
+            remaining = headers.get('x-ratelimit-remaining')
+            reset = headers.get('x-ratelimit-reset')
+            if remaining is not None and reset is not None:
+                reset_in = float(reset)
+                if reset_in > 1e9:  # Epoch timestamp rather than seconds until reset
+                    reset_in -= time.time()
+                interval = max(reset_in, 0.0) / max(float(remaining), 1.0)
+                self._intervals[key] = max(self.min_interval, interval)
+                return
+        except ValueError:
+            self.logger.debug(f"Ignoring malformed rate limit headers: {headers}")
+
+        base = self._base_interval(key)
+        current = self.interval(key)
+        self._intervals[key] = current + (base - current) * 0.1
+
+    async def backoff(self, key: str, attempt: int):
+        """
+        Slow a request class down after a rate limit error and wait before retrying.
+
+        Args:
+            key: Request class that hit the limit
+            attempt: Zero-based retry attempt, used for the exponential delay
+        """
+        delay = min(self.backoff_base * (2 ** attempt), self.max_backoff)
+        self._intervals[key] = min(self.interval(key) * 2, self.max_backoff)
+        self._next_slot[key] = max(self._next_slot.get(key, 0.0), time.monotonic() + delay)
+        self.logger.warning(f"Rate limited on {key} requests, backing off {delay:.1f}s")
+        await asyncio.sleep(delay)
@@ -1,6 +1,9 @@
 from dataclasses import dataclass
 from typing import Dict, Optional
 import logging
+from ..utils import ObjectPool
+
+logger = logging.getLogger(__name__)
 
 @dataclass
 class StopLossConfig:
@@ -15,11 +18,18 @@ class StopLossManager:
     
     def __init__(self, config: StopLossConfig):
         self.config = config
-        self.logger = logging.getLogger(__name__)
+        self.logger = logger
         self.position: Dict = {}
         self.highest_price = 0.0
         self.stop_loss_price = 0.0
         self.trailing_active = False
+        
+        # Stop distances as price multipliers, precomputed for the per-tick path
+        self._fixed_stop_mult = 1.0 - config.fixed_stop_loss_pct / 100.0
+        self._trail_mult = 1.0 - (config.trailing_stop_loss_pct or 0.0) / 100.0
+        
+        # update() runs every price tick, so its result dicts are recycled
+        self._result_pool = ObjectPool(maxsize=64)
     
     def _calculate_fixed_stop_loss(self, price: Optional[float] = None) -> float:
         """Calculate fixed stop loss price"""
@@ -27,16 +37,14 @@ class StopLossManager:
             raise ValueError("Need either a price or an active position")
             
         entry_price = price if price is not None else float(self.position['price'])
-        stop_distance = entry_price * (self.config.fixed_stop_loss_pct / 100)
-        return entry_price - stop_distance
+        return entry_price * self._fixed_stop_mult
 
     def _calculate_trailing_stop_loss(self) -> float:
         """Calculate trailing stop loss based on highest price"""
         if self.config.trailing_stop_loss_pct is None:
             raise ValueError("Trailing stop loss percentage not configured")
             
-        trail_distance = self.highest_price * (self.config.trailing_stop_loss_pct / 100)
-        return self.highest_price - trail_distance
+        return self.highest_price * self._trail_mult
 
     def start_position_tracking(self, position: Dict) -> float:
         """
@@ -56,10 +64,14 @@ class StopLossManager:
     def update(self, current_price: float) -> Dict[str, float]:
         """
         Update stop loss based on current price
-        Returns dict with current stop price and status
+        Returns dict with current stop price and status. The dict comes from a
+        pool; pass it to release() once its values have been read.
         """
+        result = self._result_pool.get()
         if not self.position:
-            return {'stop_price': 0.0, 'stop_triggered': False}
+            result['stop_price'] = 0.0
+            result['stop_triggered'] = False
+            return result
 
         # Update highest price if price has increased
         if current_price > self.highest_price:
@@ -87,12 +99,17 @@ class StopLossManager:
         # Check if stop loss is triggered
         stop_triggered = current_price <= self.stop_loss_price
 
-        return {
-            'stop_price': self.stop_loss_price,
-            'stop_triggered': stop_triggered,
-            'trailing_active': self.trailing_active,
-            'highest_price': self.highest_price
-        }
+        result['stop_price'] = self.stop_loss_price
+        result['stop_triggered'] = stop_triggered
+        result['trailing_active'] = self.trailing_active
+        result['highest_price'] = self.highest_price
+        return result
+
+    def release(self, result: Dict):
+        """
+        Return an update() result to the pool for reuse
+        """
+        self._result_pool.put(result)
 
     def calculate_max_position_size(self, balance: float, current_price: float) -> float:
         """
@@ -1,4 +1,4 @@
-from .base_strategy import BaseStrategy
+from .base_strategy import BaseStrategy, Signal
 from .simple_moving_average import SimpleMovingAverageStrategy
 
-__all__ = ['BaseStrategy', 'SimpleMovingAverageStrategy']
\ No newline at end of file
+__all__ = ['BaseStrategy', 'Signal', 'SimpleMovingAverageStrategy']
\ No newline at end of file
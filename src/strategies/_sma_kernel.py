@@ -0,0 +1,239 @@
+"""
+Compiled indicator kernels for the moving average strategies.
+
+Numba is optional: without it the kernels run as NumPy (sma_kernel,
+sma_grid) or plain Python (signal_kernel) with identical results.
+
+With Numba, the kernels are compiled for explicit signatures when this
+module is imported, so the first strategy call doesn't stall on the JIT.
+The compiled code is cached on disk between runs. Set KRAKEN_WARMUP=0 to
+compile lazily on first use instead.
+"""
+
+import os
+
+import numpy as np
+
+try:
+    from numba import njit, prange, types
+except ImportError:
+    njit = None
+    prange = range
+
+_EAGER = os.environ.get('KRAKEN_WARMUP', '1') == '1'
+
+if njit is not None:
+    _out = types.float64[::1]
+    # Close arrays can be read-only views (e.g. from pandas with copy-on-write)
+    _closes = (types.float64[::1], types.Array(types.float64, 1, 'C', readonly=True))
+    _SMA_SIGNATURES = [
+        types.void(close, types.int64, types.int64, _out, _out, _out, _out, _out)
+        for close in _closes
+    ]
+    _SIGNAL_SIGNATURES = [
+        types.Tuple((types.int64,) + (types.float64,) * 6)(close, types.int64, types.int64)
+        for close in _closes
+    ]
+
+
+def _jit(signatures=None):
+    """Compile a kernel with Numba when it's installed, eagerly if signatures are given"""
+    def decorate(func):
+        if njit is None:
+            return func
+        if _EAGER and signatures is not None:
+            return njit(signatures, cache=True, fastmath=True, nogil=True)(func)
+        return njit(cache=True, fastmath=True, nogil=True)(func)
+    return decorate
+
+
+def sma_cumsum(values, window):
+    """
+    Simple moving average from a cumulative sum, one pass whatever the window.
+    The first window - 1 values are NaN, as with pandas rolling().mean().
+
+    The running sum is always accumulated in float64; the result has the
+    dtype of floating `values`, so float32 prices give float32 averages at
+    half the memory traffic. Integer prices give float64 averages.
+    """
+    dtype = values.dtype if np.issubdtype(values.dtype, np.floating) else np.float64
+    sma = np.full(len(values), np.nan, dtype=dtype)
+    if len(values) >= window:
+        cs = np.cumsum(values, dtype=np.float64)
+        window_sums = np.empty(len(values) - window + 1)
+        window_sums[0] = cs[window - 1]
+        np.subtract(cs[window:], cs[:-window], out=window_sums[1:])
+        np.divide(window_sums, window, out=sma[window - 1:], casting='same_kind')
+    return sma
+
+
+@_jit(_SMA_SIGNATURES if njit is not None else None)
+def sma_kernel(close, short_w, long_w, short_ma, long_ma, trend, ma_diff, crossover):
+    """
+    Compute the SMA crossover indicators over a full close price history.
+
+    Single pass with running sums for both windows. Values are NaN until
+    enough candles are available, matching pandas rolling/pct_change output.
+    Runs without the GIL, so several symbols can be processed in threads.
+
+    Args:
+        close: Contiguous float64 array of close prices
+        short_w: Short moving average window
+        long_w: Long moving average window
+        short_ma, long_ma, trend, ma_diff, crossover: Contiguous float64 output
+            arrays of the same length as close
+    """
+    n = close.shape[0]
+
+    # First index where both MAs (and so ma_diff) are defined
+    first_full = max(short_w, long_w) - 1
+    short_sum = 0.0
+    long_sum = 0.0
+    prev_sign = 0
+
+    for i in range(n):
+        c = close[i]
+        short_sum += c
+        long_sum += c
+        if i >= short_w:
+            short_sum -= close[i - short_w]
+        if i >= long_w:
+            long_sum -= close[i - long_w]
+
+        short_ma[i] = short_sum / short_w if i >= short_w - 1 else np.nan
+        long_ma[i] = long_sum / long_w if i >= long_w - 1 else np.nan
+        trend[i] = c / close[i - short_w] - 1.0 if i >= short_w else np.nan
+        ma_diff[i] = short_ma[i] - long_ma[i]
+
+        # Crossover when the MA difference flips sign: compare integer signs
+        # instead of multiplying neighbouring differences. Undefined differences
+        # count as sign 0 (fastmath assumes no NaNs, so never compare them).
+        sign = 0
+        if i >= first_full:
+            d = ma_diff[i]
+            sign = (d > 0.0) - (d < 0.0)
+        crossover[i] = sign * (sign == -prev_sign)
+        prev_sign = sign
+
+
+def sma_kernel_numpy(close, short_w, long_w, short_ma, long_ma, trend, ma_diff, crossover):
+    """
+    NumPy version of sma_kernel, used when Numba isn't installed.
+
+    Same arguments and results; the moving averages come from cumulative sums.
+    """
+    n = close.shape[0]
+    short_ma[:] = sma_cumsum(close, short_w)
+    long_ma[:] = sma_cumsum(close, long_w)
+    trend[:short_w] = np.nan
+    trend[short_w:] = close[short_w:] / close[:n - short_w] - 1.0
+    np.subtract(short_ma, long_ma, out=ma_diff)
+
+    sign = np.sign(np.nan_to_num(ma_diff))  # Undefined differences count as sign 0
+    crossover[0] = 0.0
+    crossover[1:] = sign[1:] * (sign[1:] == -sign[:-1])
+    crossover += 0.0  # Turns -0.0 into 0.0
+
+
+if njit is None:
+    sma_kernel = sma_kernel_numpy
+
+
+def sma_indicators(close, short_w, long_w):
+    """
+    Allocate the output arrays and run sma_kernel.
+
+    Returns:
+        Tuple of (short_ma, long_ma, trend, ma_diff, crossover) arrays
+    """
+    n = close.shape[0]
+    outputs = tuple(np.empty(n) for _ in range(5))
+    sma_kernel(close, short_w, long_w, *outputs)
+    return outputs
+
+
+def sma_grid(close, windows, out):
+    """
+    Compute simple moving averages of one close history for many window sizes,
+    e.g. for a parameter sweep in a backtest. With Numba the windows are
+    spread over threads.
+
+    Args:
+        close: Contiguous float64 array of close prices
+        windows: int64 array of window sizes
+        out: float64 output array of shape (len(close), len(windows)); Fortran
+            order keeps each window's column contiguous. Values are NaN until a
+            window fills, as with sma_cumsum.
+    """
+    n = close.shape[0]
+    for j in prange(windows.shape[0]):
+        w = windows[j]
+        running = 0.0
+        for i in range(n):
+            running += close[i]
+            if i >= w:
+                running -= close[i - w]
+            out[i, j] = running / w if i >= w - 1 else np.nan
+
+
+def sma_grid_numpy(close, windows, out):
+    """NumPy version of sma_grid, used when Numba isn't installed"""
+    for j, w in enumerate(windows):
+        out[:, j] = sma_cumsum(close, w)
+
+
+if njit is not None:
+    sma_grid = njit(parallel=True, fastmath=True, cache=True)(sma_grid)
+else:
+    sma_grid = sma_grid_numpy
+
+
+@_jit(_SIGNAL_SIGNATURES if njit is not None else None)
+def signal_kernel(close, short_w, long_w):
+    """
+    Evaluate the SMA crossover signal of the newest candle in one compiled call.
+
+    Applies the same rules as SimpleMovingAverageStrategy._classify_signal.
+
+    Args:
+        close: Contiguous float64 array of at least max(short_w, long_w) + 1
+            trailing close prices
+        short_w: Short moving average window
+        long_w: Long moving average window
+
+    Returns:
+        Tuple of (signal, short_ma, long_ma, trend, ma_diff, prev_ma_diff, crossover),
+        where signal is 1 for buy, -1 for sell and 0 for hold
+    """
+    last = close.shape[0] - 1
+
+    short_sum = 0.0
+    prev_short_sum = 0.0
+    for i in range(short_w):
+        short_sum += close[last - i]
+        prev_short_sum += close[last - 1 - i]
+    long_sum = 0.0
+    prev_long_sum = 0.0
+    for i in range(long_w):
+        long_sum += close[last - i]
+        prev_long_sum += close[last - 1 - i]
+
+    short_ma = short_sum / short_w
+    long_ma = long_sum / long_w
+    ma_diff = short_ma - long_ma
+    prev_ma_diff = prev_short_sum / short_w - prev_long_sum / long_w
+    trend = close[last] / close[last - short_w] - 1.0
+
+    sign = int(ma_diff > 0.0) - int(ma_diff < 0.0)
+    prev_sign = int(prev_ma_diff > 0.0) - int(prev_ma_diff < 0.0)
+    crossover = sign * (sign == -prev_sign)
+
+    signal = crossover
+    if crossover == 0 and abs(trend) > 0.01:  # 1% change threshold
+        if trend > 0.0 and ma_diff > 0.0:
+            signal = 1
+        elif trend < 0.0 and ma_diff < 0.0:
+            signal = -1
+
+    return signal, short_ma, long_ma, trend, ma_diff, prev_ma_diff, float(crossover)
+
@@ -1,9 +1,49 @@
 # src/strategies/base_strategy.py
 
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+import numpy as np
 import pandas as pd
 
+# OHLCV candles as a columnar DataFrame (as returned by KrakenClient.fetch_market_data),
+# a dict of column arrays (fetch_market_data(..., as_arrays=True)) or, for older
+# callers, a list of candle dictionaries
+MarketData = Union[pd.DataFrame, Dict[str, np.ndarray], List[Dict]]
+
+@dataclass(slots=True, frozen=True)
+class Signal:
+    """
+    Trading signal for the newest candle.
+    
+    Also readable like the signal dicts strategies used to return:
+    signal['type'], 'price' in signal and signal.get(...) all work. The stop
+    loss fields are only set while a position is open, and only count as
+    present then.
+    """
+    timestamp: int
+    type: str
+    price: float
+    short_ma: float
+    long_ma: float
+    trend: float
+    ma_diff: float
+    crossover: float
+    stop_loss_price: Optional[float] = None
+    trailing_active: Optional[bool] = None
+    highest_price: Optional[float] = None
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.__dataclass_fields__ and getattr(self, key) is not None
+    
+    def __getitem__(self, key: str) -> Any:
+        if key not in self:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self else default
+
 class BaseStrategy(ABC):
     """Abstract base class for all trading strategies"""
     
@@ -17,22 +57,23 @@ class BaseStrategy(ABC):
         self.config = config
         self.position = None
         self.signals = []
+        self._pnl_scale = None  # 100 / entry price of the open position
     
     @abstractmethod
-    async def generate_signals(self, market_data: List[Dict]) -> Dict:
+    async def generate_signals(self, market_data: MarketData) -> Union[Signal, Dict]:
         """
         Generate trading signals from market data
         
         Args:
-            market_data: List of OHLCV dictionaries
+            market_data: OHLCV candles
             
         Returns:
-            Dict containing signal information
+            Signal (or a dict with the same keys) containing signal information
         """
         pass
     
     @abstractmethod
-    def calculate_position_size(self, signal: Dict, balance: float) -> float:
+    def calculate_position_size(self, signal: Union[Signal, Dict], balance: float) -> float:
         """
         Calculate the position size for a trade
         
@@ -46,19 +87,19 @@ class BaseStrategy(ABC):
         pass
     
     @abstractmethod
-    def should_exit(self, market_data: List[Dict]) -> bool:
+    def should_exit(self, market_data: MarketData) -> bool:
         """
         Determine if current position should be closed
         
         Args:
-            market_data: List of OHLCV dictionaries
+            market_data: OHLCV candles
             
         Returns:
             True if position should be closed, False otherwise
         """
         pass
 
-    def validate_signal(self, signal: Dict) -> bool:
+    def validate_signal(self, signal: Union[Signal, Dict]) -> bool:
         """
         Validate a trading signal
         
@@ -71,6 +112,51 @@ class BaseStrategy(ABC):
         required_fields = ['timestamp', 'type', 'price']
         return all(field in signal for field in required_fields)
     
+    @staticmethod
+    def _num_candles(market_data: MarketData) -> int:
+        """Number of candles in the market data"""
+        if isinstance(market_data, dict):
+            return len(market_data['close'])
+        return len(market_data)
+    
+    @staticmethod
+    def _last_close(market_data: Union[MarketData, np.ndarray]) -> float:
+        """
+        Get the most recent close price
+        
+        Args:
+            market_data: OHLCV candles, or an array of close prices
+            
+        Returns:
+            Close price of the last candle
+        """
+        if isinstance(market_data, np.ndarray):
+            return float(market_data[-1])
+        if isinstance(market_data, pd.DataFrame):
+            return float(market_data['close'].iat[-1])
+        if isinstance(market_data, dict):
+            return float(market_data['close'][-1])
+        return float(market_data[-1]['close'])
+    
+    @staticmethod
+    def _tail_closes(market_data: MarketData, count: int) -> np.ndarray:
+        """
+        Get the close prices of the last `count` candles as a float64 array
+        
+        Args:
+            market_data: OHLCV candles
+            count: Number of trailing candles
+            
+        Returns:
+            Array of up to `count` close prices, oldest first
+        """
+        if isinstance(market_data, pd.DataFrame):
+            return market_data['close'].to_numpy(dtype=np.float64)[-count:]
+        if isinstance(market_data, dict):
+            return np.asarray(market_data['close'], dtype=np.float64)[-count:]
+        tail = market_data[-count:]
+        return np.fromiter((candle['close'] for candle in tail), dtype=np.float64, count=len(tail))
+    
     def update_position(self, order: Dict):
         """
         Update the current position based on executed order
@@ -84,15 +170,17 @@ class BaseStrategy(ABC):
                 'size': order['amount'],
                 'timestamp': order['datetime']
             }
+            self._pnl_scale = 100.0 / order['price']
         else:
             self.position = None
+            self._pnl_scale = None
     
-    def calculate_risk_metrics(self, market_data: List[Dict]) -> Dict:
+    def calculate_risk_metrics(self, market_data: Union[MarketData, np.ndarray]) -> Dict:
         """
         Calculate risk metrics for current position
         
         Args:
-            market_data: List of OHLCV dictionaries
+            market_data: OHLCV candles, or an array of close prices
             
         Returns:
             Dictionary containing risk metrics
@@ -100,13 +188,15 @@ class BaseStrategy(ABC):
         if not self.position:
             return {}
             
-        current_price = market_data[-1]['close']
+        current_price = self._last_close(market_data)
         entry_price = self.position['entry_price']
         position_size = self.position['size']
         
-        unrealized_pnl = (current_price - entry_price) * position_size
+        pnl_scale = self._pnl_scale or 100.0 / entry_price
+        
+        price_change = current_price - entry_price
         return {
-            'unrealized_pnl': unrealized_pnl,
-            'pnl_percentage': (unrealized_pnl / (entry_price * position_size)) * 100,
+            'unrealized_pnl': price_change * position_size,
+            'pnl_percentage': price_change * pnl_scale,
             'position_value': current_price * position_size
         }
\ No newline at end of file
@@ -1,10 +1,48 @@
 import pandas as pd
 import numpy as np
 import logging
-from typing import Dict, List, Tuple, Optional
-from .base_strategy import BaseStrategy
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Optional, Union
+from .base_strategy import BaseStrategy, MarketData, Signal
+from ._sma_kernel import sma_cumsum, sma_indicators, sma_kernel, signal_kernel
 from ..risk import StopLossManager, StopLossConfig
 
+logger = logging.getLogger(__name__)
+
+def _crossover(ma_diff: float, prev_ma_diff: Optional[float]) -> float:
+    """
+    Crossover indicator from the last two MA differences: 1 bullish, -1 bearish, 0 none.
+    Compares integer signs like sma_kernel instead of multiplying the differences.
+    """
+    if prev_ma_diff is None:
+        return 0.0
+    sign = int(ma_diff > 0) - int(ma_diff < 0)
+    prev_sign = int(prev_ma_diff > 0) - int(prev_ma_diff < 0)
+    return float(sign * (sign == -prev_sign))
+
+# Signal for a strong trend, indexed by 3 * (trend > 0) + sign(ma_diff) + 1
+_TREND_TABLE = ('sell', 'hold', 'hold', 'hold', 'hold', 'buy')
+
+# Columns sma_kernel fills, in argument order. crossover is 1 for a bullish
+# crossover, -1 for bearish and 0 for none
+_INDICATOR_COLUMNS = ['short_ma', 'long_ma', 'trend', 'ma_diff', 'crossover']
+
+# Signal codes returned by signal_kernel
+_SIGNAL_TYPES = {1: 'buy', -1: 'sell', 0: 'hold'}
+
+@dataclass(frozen=True)
+class IndicatorSnapshot:
+    """Indicator values and signal of the newest candle"""
+    signal: str
+    price: float
+    short_ma: float
+    long_ma: float
+    trend: float
+    ma_diff: float
+    prev_ma_diff: float
+    crossover: float  # 1 for bullish crossover, -1 for bearish, 0 for none
+
 class SimpleMovingAverageStrategy(BaseStrategy):
     def __init__(self, config: Dict):
         """
@@ -14,13 +52,18 @@ class SimpleMovingAverageStrategy(BaseStrategy):
             config: Dictionary containing strategy parameters and risk management settings
         """
         super().__init__(config)
-        self.logger = logging.getLogger(__name__)
+        self.logger = logger
         
         # Strategy parameters
         self.short_window = config['parameters']['short_window']
         self.long_window = config['parameters']['long_window']
         self.position_size_pct = config['risk_management']['max_position_size']
         
+        # Derived constants read on every tick
+        self._inv_short_w = 1.0 / self.short_window
+        self._inv_long_w = 1.0 / self.long_window
+        self._min_bars = max(self.long_window, self.short_window) + 1  # MAs plus the previous MA diff
+        
         # Extract risk management parameters with defaults
         risk_config = config.get('risk_management', {})
         
@@ -33,123 +76,423 @@ class SimpleMovingAverageStrategy(BaseStrategy):
             trailing_activation_pct=risk_config.get('trailing_activation_pct')
         )
         self.stop_loss_manager = StopLossManager(stop_loss_config)
+        
+        # Incremental indicator state, advanced one candle at a time by _on_new_bar.
+        # The long close buffer also covers the trend lookback of short_window + 1
+        # candles; the short buffer evicts from its front in O(1).
+        self._closes = deque(maxlen=max(self.long_window, self.short_window + 1))
+        self._short_closes = deque(maxlen=self.short_window)
+        self._short_sum = 0.0
+        self._long_sum = 0.0
+        self._short_ma = None
+        self._long_ma = None
+        self._ma_diff = None
+        self._prev_ma_diff = None
+        self._last_ts = None
+        
+        # (timestamp, close, signal type) of the last candle generate_signals evaluated
+        self._last_signal_cache = None
+        
+        # Last stop loss update, shared by should_exit and generate_signals on a tick
+        self._last_stop_price = None
+        self._last_stop_result = None
+        
+        # One-slot cache of the last indicator snapshot and the candles it was computed from
+        self._snapshot_key = None
+        self._snapshot = None
+        
+        # One-slot cache of the last full indicator frame, keyed the same way
+        self._indicators_key = None
+        self._indicators = None
+    
+    def _reset_state(self):
+        """Clear the incremental indicator state"""
+        self._closes.clear()
+        self._short_closes.clear()
+        self._short_sum = 0.0
+        self._long_sum = 0.0
+        self._short_ma = None
+        self._long_ma = None
+        self._ma_diff = None
+        self._prev_ma_diff = None
+        self._last_ts = None
     
-    def _calculate_indicators(self, market_data: List[Dict]) -> pd.DataFrame:
+    def _seed_state(self, closes: np.ndarray):
+        """
+        Rebuild the incremental state from trailing closes in one vectorized
+        pass instead of ingesting them one at a time.
+        
+        Args:
+            closes: Trailing close prices, oldest first
+        """
+        self._reset_state()
+        self._closes.extend(closes.tolist())
+        self._short_closes.extend(closes[-self.short_window:].tolist())
+        self._short_sum = float(closes[-self.short_window:].sum())
+        self._long_sum = float(closes[-self.long_window:].sum())
+        self._update_mas()
+        
+        ma_diff = sma_cumsum(closes, self.short_window) - sma_cumsum(closes, self.long_window)
+        self._ma_diff = None if np.isnan(ma_diff[-1]) else float(ma_diff[-1])
+        if len(ma_diff) >= 2 and not np.isnan(ma_diff[-2]):
+            self._prev_ma_diff = float(ma_diff[-2])
+    
+    def _update_mas(self):
+        """Refresh the cached MAs from the running sums; None until a window fills"""
+        self._short_ma = (
+            self._short_sum * self._inv_short_w
+            if len(self._short_closes) >= self.short_window else None
+        )
+        self._long_ma = (
+            self._long_sum * self._inv_long_w
+            if len(self._closes) >= self.long_window else None
+        )
+    
+    def _current_ma_diff(self) -> Optional[float]:
+        """MA difference for the newest close, or None until both windows fill"""
+        if self._short_ma is None or self._long_ma is None:
+            return None
+        return self._short_ma - self._long_ma
+    
+    def _on_new_bar(self, close: float):
+        """
+        Push a new close into the incremental state, evicting the oldest
+        close from each running window sum.
+        
+        Args:
+            close: Close price of the new candle
+        """
+        short_closes = self._short_closes
+        if len(short_closes) == self.short_window:
+            self._short_sum -= short_closes[0]
+        short_closes.append(close)
+        
+        closes = self._closes
+        if len(closes) >= self.long_window:
+            self._long_sum -= closes[-self.long_window]
+        closes.append(close)
+        
+        self._short_sum += close
+        self._long_sum += close
+        self._update_mas()
+        
+        self._prev_ma_diff = self._ma_diff
+        self._ma_diff = self._current_ma_diff()
+    
+    def _revise_last(self, close: float):
+        """
+        Replace the close of the newest candle (an in-progress candle being updated).
+        
+        Args:
+            close: Updated close price
+        """
+        delta = close - self._closes[-1]
+        self._closes[-1] = close
+        self._short_closes[-1] = close
+        self._short_sum += delta
+        self._long_sum += delta
+        self._update_mas()
+        self._ma_diff = self._current_ma_diff()
+    
+    @staticmethod
+    def _bar(market_data: MarketData, i: int) -> Tuple[int, float]:
+        """Get the (timestamp, close) pair of candle i"""
+        if isinstance(market_data, pd.DataFrame):
+            return int(market_data['timestamp'].iat[i]), float(market_data['close'].iat[i])
+        if isinstance(market_data, dict):
+            return int(market_data['timestamp'][i]), float(market_data['close'][i])
+        candle = market_data[i]
+        return candle['timestamp'], float(candle['close'])
+    
+    def _sync_state(self, market_data: MarketData):
+        """
+        Bring the incremental state up to date with the given candles.
+        
+        Only candles newer than the last ingested one are processed. If the
+        candles don't continue the ingested series (cold start, a gap wider
+        than the buffer, or a different series) the state is rebuilt from the
+        tail of the data.
+        
+        Args:
+            market_data: OHLCV candles
+        """
+        n = self._num_candles(market_data)
+        start = None
+        
+        if self._last_ts is not None and len(self._closes) >= 2:
+            # Walk back to the newest candle we've already ingested
+            i = n - 1
+            lowest = max(1, n - self._closes.maxlen)
+            while i >= lowest and self._bar(market_data, i)[0] > self._last_ts:
+                i -= 1
+            
+            if i >= 1:
+                ts, close = self._bar(market_data, i)
+                _, prev_close = self._bar(market_data, i - 1)
+                if ts == self._last_ts and prev_close == self._closes[-2]:
+                    if close != self._closes[-1]:
+                        self._revise_last(close)
+                    start = i + 1
+        
+        if start is None:
+            # Seed from one candle more than the buffer holds so the previous MA difference is known
+            self._seed_state(self._tail_closes(market_data, self._closes.maxlen + 1))
+        else:
+            for i in range(start, n):
+                self._on_new_bar(self._bar(market_data, i)[1])
+        self._last_ts = self._bar(market_data, n - 1)[0]
+    
+    def _data_key(self, market_data: MarketData, n: int) -> Tuple:
+        """
+        Cache key for computations over a candle container: its identity,
+        length and newest candle. Candles are expected to only ever be
+        appended or have their newest candle revised, which this catches.
+        """
+        return (id(market_data), n, *self._bar(market_data, -1))
+    
+    def _calculate_indicators(self, market_data: MarketData) -> pd.DataFrame:
         """
         Calculate technical indicators for the strategy.
         
+        The last result is cached, so repeated calls on the same candles return
+        the same DataFrame. Treat it as read-only.
+        
         Args:
-            market_data: List of dictionaries containing OHLCV data
+            market_data: OHLCV candles
             
         Returns:
-            DataFrame with calculated indicators
+            DataFrame with calculated indicators. For a DataFrame input all its
+            columns are kept; otherwise only timestamp and close are carried over.
         """
-        df = pd.DataFrame(market_data)
+        n = self._num_candles(market_data)
+        key = self._data_key(market_data, n) if n else None
+        if key is not None and key == self._indicators_key:
+            return self._indicators
         
-        # Calculate simple Moving Averages
-        df['short_ma'] = df['close'].rolling(window=self.short_window).mean()
-        df['long_ma'] = df['close'].rolling(window=self.long_window).mean()
+        if isinstance(market_data, pd.DataFrame):
+            # Indicators from an earlier pass are replaced, not duplicated
+            base = market_data.drop(columns=_INDICATOR_COLUMNS, errors='ignore')
+        elif isinstance(market_data, dict):
+            base = pd.DataFrame({
+                'timestamp': market_data['timestamp'],
+                'close': market_data['close']
+            })
+        else:
+            # Pull just the columns the strategy reads instead of inferring a frame from dicts
+            base = pd.DataFrame({
+                'timestamp': np.fromiter((c['timestamp'] for c in market_data), dtype=np.int64, count=n),
+                'close': np.fromiter((c['close'] for c in market_data), dtype=np.float64, count=n)
+            })
         
-        # Calculate trend strength using the close price
-        df['trend'] = df['close'].pct_change(periods=self.short_window)
+        # Moving averages, trend strength and MA crossover in one compiled pass, written
+        # straight into the columns of one Fortran-ordered buffer that backs the frame
+        close = np.ascontiguousarray(base['close'].to_numpy(dtype=np.float64))
+        out = np.empty((n, len(_INDICATOR_COLUMNS)), order='F')
+        sma_kernel(close, self.short_window, self.long_window,
+                   *(out[:, j] for j in range(out.shape[1])))
+        indicators = pd.DataFrame(out, columns=_INDICATOR_COLUMNS, index=base.index, copy=False)
         
-        # Calculate MA crossover signal
-        df['ma_diff'] = df['short_ma'] - df['long_ma']
-        df['crossover'] = np.where(
-            df['ma_diff'] * df['ma_diff'].shift(1) < 0,  # Detect sign change
-            np.sign(df['ma_diff']),  # 1 for bullish crossover, -1 for bearish
-            0  # No crossover
-        )
+        # New frame, so indicator columns don't leak into the caller's DataFrame
+        df = pd.concat([base, indicators], axis=1)
         
+        self._indicators_key = key
+        self._indicators = df
         return df
     
-    def _detect_signal(self, df: pd.DataFrame) -> str:
+    def _indicator_snapshot(self, market_data: MarketData) -> Optional[IndicatorSnapshot]:
+        """
+        Calculate the indicators of the newest candle only, straight from the
+        close prices and without building a DataFrame.
+        
+        This is a point-in-time evaluator: only the trailing candles the
+        windows need are read, however long the history is.
+        
+        Args:
+            market_data: OHLCV candles
+            
+        Returns:
+            IndicatorSnapshot, or None if there are too few candles
+        """
+        n = self._num_candles(market_data)
+        if n < self._min_bars:
+            return None
+        
+        key = self._data_key(market_data, n)
+        if key == self._snapshot_key:
+            return self._snapshot
+        
+        close = np.ascontiguousarray(self._tail_closes(market_data, self._min_bars))
+        signal, short_ma, long_ma, trend, ma_diff, prev_ma_diff, crossover = signal_kernel(
+            close, self.short_window, self.long_window
+        )
+        
+        self._snapshot_key = key
+        self._snapshot = IndicatorSnapshot(
+            signal=_SIGNAL_TYPES[signal],
+            price=float(close[-1]),
+            short_ma=short_ma,
+            long_ma=long_ma,
+            trend=trend,
+            ma_diff=ma_diff,
+            prev_ma_diff=prev_ma_diff,
+            crossover=crossover
+        )
+        return self._snapshot
+    
+    def _detect_signal(self, snapshot: Optional[IndicatorSnapshot]) -> str:
         """
         Detect trading signals based on MA crossover and trend.
         
         Args:
-            df: DataFrame with calculated indicators
+            snapshot: Indicators of the newest candle
             
         Returns:
             Signal type: 'buy', 'sell', or 'hold'
         """
-        if len(df) < self.long_window + 1:
-            return 'hold'
-        
-        # Get last row with all indicators
-        df = df.dropna()
-        if len(df) == 0:
+        if snapshot is None:
             return 'hold'
             
-        last_row = df.iloc[-1]
+        return snapshot.signal
+    
+    @staticmethod
+    def _classify_signal(crossover: float, trend: float, ma_diff: float) -> str:
+        """
+        Classify the latest indicator values into a trading signal.
         
+        Args:
+            crossover: MA crossover indicator (1 bullish, -1 bearish, 0 none)
+            trend: Close price change over the short window
+            ma_diff: Short MA minus long MA
+            
+        Returns:
+            Signal type: 'buy', 'sell', or 'hold'
+        """
         # Check for crossover signal
-        if last_row['crossover'] > 0:  # Bullish crossover
+        if crossover > 0:  # Bullish crossover
             return 'buy'
-        elif last_row['crossover'] < 0:  # Bearish crossover
+        elif crossover < 0:  # Bearish crossover
             return 'sell'
             
-        # If no crossover, check trend direction
-        strong_trend = abs(last_row['trend']) > 0.01  # 1% change threshold
-        
-        if strong_trend:
-            if last_row['trend'] > 0 and last_row['ma_diff'] > 0:
-                return 'buy'
-            elif last_row['trend'] < 0 and last_row['ma_diff'] < 0:
-                return 'sell'
-        
-        return 'hold'
+        # If no crossover, a strong trend confirmed by the MA difference decides
+        strong_trend = abs(trend) > 0.01  # 1% change threshold
+        if not strong_trend:
+            return 'hold'
+        return _TREND_TABLE[3 * (trend > 0) + (ma_diff > 0) - (ma_diff < 0) + 1]
     
-    async def generate_signals(self, market_data: List[Dict]) -> Dict:
+    async def generate_signals(self, market_data: MarketData) -> Signal:
         """
         Generate trading signals and manage risk.
         
         Args:
-            market_data: List of dictionaries containing OHLCV data
+            market_data: OHLCV candles
             
         Returns:
-            Dictionary containing signal information and risk metrics
+            Signal with indicator values and stop loss status
+        """
+        return self._generate_signals_sync(market_data)
+    
+    def _generate_signals_sync(self, market_data: MarketData) -> Signal:
         """
-        if len(market_data) < self.long_window + 1:
-            raise ValueError(f"Insufficient data. Need at least {self.long_window + 1} points")
+        Synchronous body of generate_signals. Signal generation never awaits,
+        so backtests can call this directly and skip the coroutine overhead.
+        
+        Args:
+            market_data: OHLCV candles
             
-        df = self._calculate_indicators(market_data)
-        signal_type = self._detect_signal(df)
-        current_price = float(df.iloc[-1]['close'])
+        Returns:
+            Signal with indicator values and stop loss status
+        """
+        if self._num_candles(market_data) < self._min_bars:
+            raise ValueError(f"Insufficient data. Need at least {self._min_bars} points")
+            
+        # Advance the running MA state by the new candles only
+        self._sync_state(market_data)
+        
+        closes = self._closes
+        current_price = closes[-1]
+        short_ma = self._short_ma
+        long_ma = self._long_ma
+        ma_diff = self._ma_diff
+        trend = current_price / closes[-1 - self.short_window] - 1
+        crossover = _crossover(ma_diff, self._prev_ma_diff)
+        signal_type = self._classify_signal(crossover, trend, ma_diff)
+        self._last_signal_cache = (self._last_ts, current_price, signal_type)
         
         # Get stop loss status if we have a position
         stop_loss_status = None
         if self.position:
-            stop_loss_status = self.stop_loss_manager.update(current_price)
+            stop_loss_status = self._stop_update(current_price)
             
             # Check for stop loss trigger
             if stop_loss_status['stop_triggered']:
                 signal_type = 'sell'
                 self.logger.info(f"Stop loss triggered at {current_price}")
         
-        last_row = df.iloc[-1]
-        signal = {
-            'timestamp': last_row['timestamp'],
-            'type': signal_type,
-            'price': current_price,
-            'short_ma': last_row['short_ma'],
-            'long_ma': last_row['long_ma'],
-            'trend': last_row['trend'],
-            'ma_diff': last_row['ma_diff'],
-            'crossover': last_row['crossover']
-        }
-        
-        # Add stop loss information if available
-        if stop_loss_status:
-            signal.update({
-                'stop_loss_price': stop_loss_status['stop_price'],
-                'trailing_active': stop_loss_status['trailing_active'],
-                'highest_price': stop_loss_status['highest_price']
-            })
+        signal = Signal(
+            timestamp=self._last_ts,
+            type=signal_type,
+            price=current_price,
+            short_ma=short_ma,
+            long_ma=long_ma,
+            trend=trend,
+            ma_diff=ma_diff,
+            crossover=crossover,
+            # Stop loss information if we have a position
+            stop_loss_price=stop_loss_status['stop_price'] if stop_loss_status else None,
+            trailing_active=stop_loss_status['trailing_active'] if stop_loss_status else None,
+            highest_price=stop_loss_status['highest_price'] if stop_loss_status else None
+        )
             
         return signal
     
-    def calculate_position_size(self, signal: Dict, balance: float) -> float:
+    def generate_signals_batch(self, market_data: MarketData) -> np.ndarray:
+        """
+        Evaluate the strategy signal at every candle of a history in one pass,
+        for backtests. Signal i is what generate_signals would give for the
+        candles up to and including i, before any stop loss override.
+        
+        Args:
+            market_data: OHLCV candles
+            
+        Returns:
+            int8 array of signal codes per candle: 1 buy, -1 sell, 0 hold
+        """
+        close = np.ascontiguousarray(self._tail_closes(market_data, self._num_candles(market_data)))
+        _, _, trend, ma_diff, crossover = sma_indicators(close, self.short_window, self.long_window)
+        
+        # Trend rule where there's no crossover; NaN comparisons are False, so undefined rows hold
+        strong_trend = np.abs(trend) > 0.01
+        trend_signal = (
+            (strong_trend & (trend > 0) & (ma_diff > 0)).astype(np.int8)
+            - (strong_trend & (trend < 0) & (ma_diff < 0)).astype(np.int8)
+        )
+        signals = np.where(crossover != 0, crossover, trend_signal).astype(np.int8)
+        signals[:self._min_bars - 1] = 0
+        return signals
+    
+    def _stop_update(self, price: float) -> Dict:
+        """
+        Update the stop loss at a price, reusing the last result when the price
+        hasn't changed (an update at the same price changes nothing). This lets
+        should_exit and generate_signals share one update per tick.
+        
+        The result stays owned by the strategy and must not be released.
+        
+        Args:
+            price: Current price
+            
+        Returns:
+            Stop loss status from StopLossManager.update
+        """
+        if self._last_stop_result is not None:
+            if price == self._last_stop_price:
+                return self._last_stop_result
+            self.stop_loss_manager.release(self._last_stop_result)
+        self._last_stop_result = self.stop_loss_manager.update(price)
+        self._last_stop_price = price
+        return self._last_stop_result
+    
+    def calculate_position_size(self, signal: Union[Signal, Dict], balance: float) -> float:
         """
         Calculate position size considering both strategy and risk parameters.
         
@@ -160,27 +503,29 @@ class SimpleMovingAverageStrategy(BaseStrategy):
         Returns:
             Position size in base currency
         """
+        # Only buys open positions; returning early skips the stop loss sizing
         if signal['type'] != 'buy':
             return 0.0
+        price = signal['price']
             
         # Calculate position size based on strategy parameters
-        strategy_size = (balance * self.position_size_pct) / signal['price']
+        strategy_size = balance * self.position_size_pct / price
         
         # Calculate maximum position size based on stop loss
         risk_size = self.stop_loss_manager.calculate_max_position_size(
             balance=balance,
-            current_price=signal['price']
+            current_price=price
         )
         
         # Use the smaller of the two sizes
         return min(strategy_size, risk_size)
     
-    def should_exit(self, market_data: List[Dict]) -> bool:
+    def should_exit(self, market_data: MarketData) -> bool:
         """
         Determine if position should be closed based on signals or stop loss.
         
         Args:
-            market_data: List of dictionaries containing OHLCV data
+            market_data: OHLCV candles
             
         Returns:
             Boolean indicating whether to exit position
@@ -188,17 +533,20 @@ class SimpleMovingAverageStrategy(BaseStrategy):
         if not self.position:
             return False
             
-        current_price = float(market_data[-1]['close'])
+        current_price = self._last_close(market_data)
         
         # Check stop loss first
-        stop_loss_status = self.stop_loss_manager.update(current_price)
-        if stop_loss_status['stop_triggered']:
+        if self._stop_update(current_price)['stop_triggered']:
             self.logger.info("Exit signal: Stop loss triggered")
             return True
             
-        # Check strategy signals
-        df = self._calculate_indicators(market_data)
-        signal = self._detect_signal(df)
+        # Check strategy signals, reusing generate_signals' result for the same candle
+        last_ts, last_close = self._bar(market_data, -1)
+        cache = self._last_signal_cache
+        if cache is not None and cache[0] == last_ts and cache[1] == last_close:
+            signal = cache[2]
+        else:
+            signal = self._detect_signal(self._indicator_snapshot(market_data))
         
         if signal == 'sell':
             self.logger.info("Exit signal: Strategy sell signal")
@@ -215,6 +563,11 @@ class SimpleMovingAverageStrategy(BaseStrategy):
         """
         super().update_position(order)
         
+        # Stop loss state changes with the position, so the shared update is stale
+        if self._last_stop_result is not None:
+            self.stop_loss_manager.release(self._last_stop_result)
+            self._last_stop_result = None
+        
         # Initialize stop loss tracking for new positions
         if order['side'] == 'buy':
             self.stop_loss_manager.start_position_tracking(order)
@@ -0,0 +1,3 @@
+from .pool import ObjectPool
+
+__all__ = ['ObjectPool']
@@ -0,0 +1,28 @@
+from typing import Dict, List
+
+class ObjectPool:
+    """Free list of reusable dictionaries for short-lived, frequently allocated results"""
+    
+    def __init__(self, maxsize: int = 64):
+        """
+        Initialize an empty pool.
+        
+        Args:
+            maxsize: Maximum number of idle dictionaries kept for reuse
+        """
+        self.maxsize = maxsize
+        self._free: List[Dict] = []
+    
+    def get(self) -> Dict:
+        """
+        Take an empty dictionary from the pool, or a new one if the pool is empty
+        """
+        return self._free.pop() if self._free else {}
+    
+    def put(self, obj: Dict):
+        """
+        Clear a dictionary and return it to the pool. The caller must not use it afterwards.
+        """
+        if len(self._free) < self.maxsize:
+            obj.clear()
+            self._free.append(obj)
@@ -4,4 +4,7 @@ from pathlib import Path
 
 # Add the project root directory to Python path
 project_root = str(Path(__file__).parent.parent)
-sys.path.insert(0, project_root)
\ No newline at end of file
+sys.path.insert(0, project_root)
+
+# Share compiled Numba kernels between xdist workers and test runs
+os.environ.setdefault('NUMBA_CACHE_DIR', str(Path(project_root) / '.numba_cache'))
@@ -1,14 +1,19 @@
 import pytest
+import asyncio
+import time
 import ccxt
 from unittest.mock import Mock, AsyncMock, patch
 from datetime import datetime
 from pathlib import Path
 import json
+import numpy as np
 import os
 
 from src.exchanges.kraken_client import KrakenClient
+from src.exchanges.rate_limiter import AdaptiveRateLimiter
 
-pytestmark = pytest.mark.asyncio
+# Paper trading tests share the on-disk state files, so keep them on one xdist worker
+pytestmark = pytest.mark.xdist_group('paper_state')
 
 @pytest.fixture
 def mock_exchange():
@@ -19,19 +24,27 @@ def mock_exchange():
     mock_instance.create_order = AsyncMock()
     mock_instance.fetch_balance = AsyncMock()
     
-    with patch('ccxt.kraken', return_value=mock_instance) as mock_kraken:
+    async def idle_watch_ohlcv(*args, **kwargs):
+        # Websocket stream that never delivers, so tests exercise the REST refill
+        await asyncio.Event().wait()
+    mock_instance.watch_ohlcv = AsyncMock(side_effect=idle_watch_ohlcv)
+    
+    with patch('ccxt.pro.kraken', return_value=mock_instance) as mock_kraken:
         yield mock_instance
     print("[TEARDOWN] Mock exchange cleaned up")
 
 @pytest.fixture
-def client(mock_exchange):
+async def client(mock_exchange):
     print("[SETUP] Initializing KrakenClient with $100k USD paper trading balance")
-    return KrakenClient(
+    client = KrakenClient(
         api_key="test_key", 
         api_secret="test_secret", 
         paper_trading=True,
         paper_balance={'USD': 100000, 'BTC': 0}
     )
+    yield client
+    # Release the order log before teardown_method removes the state files
+    await client.close()
 
 class TestKrakenClient:
     """Test suite for KrakenClient"""
@@ -50,14 +63,66 @@ class TestKrakenClient:
         result = await client.fetch_market_data("BTC/USD")
 
         print(f"  → Retrieved {len(result)} candles")
-        print(f"  → First candle: Open=${result[0]['open']}, Close=${result[0]['close']}")
+        print(f"  → First candle: Open=${result['open'].iat[0]}, Close=${result['close'].iat[0]}")
         
         assert len(result) == 2
-        assert result[0]['timestamp'] == 1609459200000
-        assert result[0]['open'] == 29000.0
+        assert result['timestamp'].iat[0] == 1609459200000
+        assert result['open'].iat[0] == 29000.0
         mock_exchange.fetch_ohlcv.assert_called_once_with("BTC/USD", "1m", limit=100)
+        
+        columns = await client.fetch_market_data("BTC/USD", as_arrays=True)
+        assert columns['close'].flags['C_CONTIGUOUS']
+        assert columns['close'].tolist() == [29050.0, 29100.0]
+        assert columns['timestamp'].dtype == np.int64
         print("✓ Market data fetch test passed")
 
+    async def test_fetch_market_data_serves_fresh_buffer(self, client, mock_exchange):
+        print("\n[TEST] Testing market data is served from the candle buffer...")
+        
+        # Two 1m candles, the newest one still in progress
+        now_ms = int(time.time() * 1000) // 60000 * 60000
+        mock_exchange.fetch_ohlcv.return_value = [
+            [now_ms - 60000, 29000.0, 29100.0, 28900.0, 29050.0, 100.0],
+            [now_ms, 29050.0, 29150.0, 28950.0, 29100.0, 150.0]
+        ]
+
+        await client.fetch_market_data("BTC/USD", limit=2)
+        
+        print("  → Streaming an update to the in-progress candle")
+        client._merge_candles(
+            client._ohlcv_buffer[("BTC/USD", "1m")],
+            [[now_ms, 29050.0, 29200.0, 28950.0, 29180.0, 180.0]]
+        )
+        result = await client.fetch_market_data("BTC/USD", limit=2)
+
+        assert len(result) == 2
+        assert result['close'].iat[-1] == 29180.0
+        mock_exchange.fetch_ohlcv.assert_called_once_with("BTC/USD", "1m", limit=2)
+        print("✓ Candle buffer test passed")
+
+    async def test_fetch_market_data_many(self, client, mock_exchange):
+        print("\n[TEST] Testing concurrent multi-symbol market data fetching...")
+        
+        candles = {
+            "BTC/USD": [[1609459200000, 29000.0, 29100.0, 28900.0, 29050.0, 100.0]],
+            "ETH/USD": [[1609459200000, 730.0, 735.0, 728.0, 733.0, 900.0]]
+        }
+        
+        async def fetch_ohlcv(symbol, timeframe, limit):
+            if symbol not in candles:
+                raise ccxt.BadSymbol(f"Unknown symbol {symbol}")
+            return candles[symbol]
+        mock_exchange.fetch_ohlcv.side_effect = fetch_ohlcv
+
+        print("  → Fetching BTC/USD, ETH/USD and an unknown pair...")
+        result = await client.fetch_market_data_many(["BTC/USD", "ETH/USD", "XXX/USD"], limit=1)
+
+        print(f"  → Retrieved data for: {list(result.keys())}")
+        assert set(result) == {"BTC/USD", "ETH/USD"}
+        assert result["ETH/USD"]['close'].iat[0] == 733.0
+        assert mock_exchange.fetch_ohlcv.call_count == 3
+        print("✓ Multi-symbol fetch test passed")
+
     async def test_paper_trading_order(self, client, mock_exchange):
         print("\n[TEST] Testing paper trading order execution...")
         
@@ -102,9 +167,24 @@ class TestKrakenClient:
         
         assert final_balance['BTC']['free'] == pytest.approx(0.0)
         assert final_balance['USD']['free'] == pytest.approx(101000.0)
+        fetched = await client.fetch_order(sell_order['id'], "BTC/USD")
+        assert fetched == sell_order
+        assert 'datetime' in fetched and json.loads(json.dumps(fetched)) == fetched
         print("✓ Paper trading order test passed")
 
-    async def test_paper_trading_persistence(self, client):
+    async def test_paper_order_with_known_price(self, client, mock_exchange):
+        print("\n[TEST] Testing paper market order filled at a caller-supplied price...")
+        
+        order = await client.create_order("BTC/USD", "market", "buy", 1.0, last_price=29500.0)
+        
+        print(f"  → Order executed: {order['side']} {order['amount']} BTC @ ${order['price']}")
+        assert order['price'] == 29500.0
+        assert datetime.fromisoformat(order['datetime']).timestamp() == pytest.approx(order['timestamp'] / 1000)
+        assert client.paper_balance['USD'] == pytest.approx(70500.0)
+        mock_exchange.fetch_ticker.assert_not_awaited()
+        print("✓ Known price order test passed")
+
+    async def test_paper_trading_persistence(self, client, mock_exchange):
         print("\n[TEST] Testing paper trading state persistence...")
         
         await client.fetch_balance()
@@ -117,15 +197,89 @@ class TestKrakenClient:
             state = json.load(f)
             print("  → Loaded state file contains:")
             print(f"    - Balance data: {list(state['balance'].keys())}")
-            print(f"    - Number of orders: {len(state['orders'])}")
+            print(f"    - Orders covered: {state['order_count']}")
             
         assert 'balance' in state
-        assert 'orders' in state
+        assert state['order_count'] == 0
+        
+        mock_exchange.fetch_ticker.return_value = {'last': 29000.0}
+        await client.create_order("BTC/USD", "market", "buy", 1.0)
+        
+        orders_log = Path('data/paper_trading_results/orders.jsonl')
+        print(f"  → Checking for order log at: {orders_log}")
+        with open(orders_log, 'r') as f:
+            logged = [json.loads(line) for line in f]
+        assert [order['id'] for order in logged] == ['paper_0']
         print("✓ Paper trading persistence test passed")
 
+    async def test_paper_trading_state_replay(self, client, mock_exchange):
+        print("\n[TEST] Testing paper trading state replay from the order log...")
+        
+        mock_exchange.fetch_ticker.return_value = {'last': 29000.0}
+        for _ in range(3):
+            await client.create_order("BTC/USD", "market", "buy", 0.5)
+        mock_exchange.fetch_ticker.return_value = {'last': 30000.0}
+        await client.create_order("BTC/USD", "market", "sell", 1.0)
+        
+        # Only the first order is covered by a snapshot; the rest are in the log
+        client._orders_log.flush()
+        
+        print("  → Reloading state into a fresh client")
+        restored = KrakenClient(paper_trading=True, paper_balance={'USD': 1})
+        restored._load_paper_trading_state()
+        
+        print(f"  → Restored balance: {restored.paper_balance}")
+        assert restored.paper_balance == pytest.approx(client.paper_balance)
+        assert len(restored.paper_orders) == 4
+        assert (await restored.fetch_order('paper_3', "BTC/USD"))['side'] == 'sell'
+        await restored.close()
+        await client.close()
+        print("✓ Paper trading replay test passed")
+
+    async def test_rate_limited_requests(self, mock_exchange):
+        print("\n[TEST] Testing adaptive rate limiting of REST requests...")
+        
+        fetch2 = AsyncMock(side_effect=[
+            ccxt.DDoSProtection("kraken {\"error\":[\"EGeneral:Too many requests\"]}"),
+            {'result': {}}
+        ])
+        mock_exchange.fetch2 = fetch2
+        mock_exchange.last_response_headers = {'X-RateLimit-Remaining': '10', 'X-RateLimit-Reset': '5'}
+        
+        client = KrakenClient(paper_trading=False)
+        client._rate_limiter = AdaptiveRateLimiter({'public': 0.0}, backoff_base=0.001)
+
+        print("  → Sending a request that is rate limited once")
+        response = await client.exchange.fetch2('OHLC', 'public')
+
+        print(f"  → Request spacing now {client._rate_limiter.interval('public')}s")
+        assert response == {'result': {}}
+        assert fetch2.call_count == 2
+        assert client._rate_limiter.interval('public') == pytest.approx(0.5)
+        print("✓ Rate limiting test passed")
+
+    async def test_context_manager_closes_exchange(self, mock_exchange):
+        print("\n[TEST] Testing async context manager cleanup...")
+        
+        async with KrakenClient(paper_trading=True) as client:
+            mock_exchange.fetch_ohlcv.return_value = []
+            await client.fetch_market_data("BTC/USD")
+            watcher = client._ohlcv_watchers[("BTC/USD", "1m")]
+            assert client._http_session is not None
+        
+        # Let the cancelled watcher task finish unwinding
+        await asyncio.sleep(0)
+        
+        print("  → Exchange closed, watcher cancelled")
+        mock_exchange.close.assert_awaited_once()
+        assert watcher.cancelled()
+        assert client._http_session is None
+        print("✓ Context manager test passed")
+
     def teardown_method(self, method):
         """Clean up after each test method"""
-        state_file = Path('data/paper_trading_results/trading_state.json')
-        if state_file.exists():
-            print(f"\n[CLEANUP] Removing state file: {state_file}")
-            os.remove(state_file)
\ No newline at end of file
+        for state_file in (Path('data/paper_trading_results/trading_state.json'),
+                           Path('data/paper_trading_results/orders.jsonl')):
+            if state_file.exists():
+                print(f"\n[CLEANUP] Removing state file: {state_file}")
+                os.remove(state_file)
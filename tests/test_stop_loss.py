@@ -57,4 +57,16 @@ def test_no_trailing_stop():
     # Price moves up - should not activate trailing
     status = manager.update(1015.0)
     assert not status['trailing_active']
-    assert status['stop_price'] == 980.0  # Fixed stop remains
\ No newline at end of file
+    assert status['stop_price'] == 980.0  # Fixed stop remains
+
+def test_update_result_reuse(stop_loss_manager):
+    """Test that released update results are recycled"""
+    stop_loss_manager.start_position_tracking({'price': 1000.0, 'amount': 1.0})
+    
+    status = stop_loss_manager.update(1005.0)
+    assert status['stop_price'] == pytest.approx(980.0)
+    stop_loss_manager.release(status)
+    
+    reused = stop_loss_manager.update(1010.0)
+    assert reused is status
+    assert reused['highest_price'] == 1010.0
@@ -1,12 +1,17 @@
 # tests/test_strategy.py
 
+import os
 import pytest
+from math import isclose
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from typing import List, Dict
+from datetime import datetime
+from typing import List, Dict, Optional, Union
+from unittest.mock import patch
 
+from src.strategies import Signal
 from src.strategies.simple_moving_average import SimpleMovingAverageStrategy
+from src.strategies._sma_kernel import sma_cumsum, sma_grid, sma_indicators, sma_kernel_numpy
 
 @pytest.fixture
 def strategy_config():
@@ -24,61 +29,74 @@ def strategy_config():
         }
     }
 
-def generate_trend_data(base_price: float, periods: int, trend: str = 'up') -> List[Dict]:
-    """Generate price data with clear trend reversals"""
-    data = []
-    base_time = datetime(2024, 1, 1)
-    
-    for i in range(periods):
-        if trend == 'up':
-            # First third: sideways with slight upward bias
-            if i < periods // 3:
-                change = 0.001
-            # Middle third: strong upward trend
-            elif i < 2 * periods // 3:
-                change = 0.05
-            # Final third: continued but slower upward trend
-            else:
-                change = 0.02
-        else:  # downtrend
-            # First third: sideways with slight downward bias
-            if i < periods // 3:
-                change = -0.001
-            # Middle third: strong downward trend
-            elif i < 2 * periods // 3:
-                change = -0.05
-            # Final third: continued but slower downward trend
-            else:
-                change = -0.02
-        
-        # Calculate cumulative effect
-        price = base_price * (1 + change * (i - periods // 3))
-        
-        # Add minimal noise
-        noise = np.random.normal(0, 0.0001 * price)
-        final_price = price + noise
-        
-        data.append({
-            'timestamp': int((base_time + timedelta(hours=i)).timestamp() * 1000),
-            'open': final_price * 0.999,
-            'high': final_price * 1.001,
-            'low': final_price * 0.998,
-            'close': final_price,
-            'volume': 1000 + i * 100
-        })
+@pytest.fixture
+def strategy(strategy_config):
+    # Function-scoped: the strategy keeps position, indicator and cache state between calls
+    return SimpleMovingAverageStrategy(strategy_config)
+
+@pytest.fixture(scope='session')
+def rng():
+    """Random generator shared by tests whose assertions don't depend on the exact noise"""
+    return np.random.default_rng(0)
+
+def generate_trend_data(base_price: float, periods: int, trend: str = 'up',
+                        as_frame: bool = True,
+                        rng: Optional[np.random.Generator] = None) -> Union[pd.DataFrame, List[Dict]]:
+    """
+    Generate price data with clear trend reversals, as a columnar DataFrame
+    or, with as_frame=False, the older list of candle dicts. The noise is
+    drawn from `rng`, a generator seeded with 0 by default, so data is reproducible.
+    """
+    if rng is None:
+        rng = np.random.default_rng(0)
+    i = np.arange(periods, dtype=np.int64)  # int64 so millisecond offsets never overflow
+    third = periods // 3
+    
+    # Sideways with a slight bias for the first third, a strong trend in the
+    # middle third, then the trend continues more slowly
+    change = np.where(i < third, 0.001, np.where(i < 2 * periods // 3, 0.05, 0.02))
+    if trend != 'up':
+        change = -change
+    
+    # Cumulative effect plus minimal noise
+    price = base_price * (1 + change * (i - third))
+    final_price = price + rng.normal(0.0, 1.0, size=periods) * (0.0001 * price)
     
-    return data
+    base_ms = int(datetime(2024, 1, 1).timestamp() * 1000)
+    columns = {
+        'timestamp': base_ms + i * 3_600_000,
+        'open': final_price * 0.999,
+        'high': final_price * 1.001,
+        'low': final_price * 0.998,
+        'close': final_price,
+        'volume': 1000 + i * 100
+    }
+    
+    if as_frame:
+        return pd.DataFrame(columns)
+    return [dict(zip(columns, row)) for row in zip(*(col.tolist() for col in columns.values()))]
+
+@pytest.fixture(scope='module')
+def uptrend_data():
+    return generate_trend_data(1000, 20, 'up')
 
-def visualize_signals(market_data: List[Dict], strategy: SimpleMovingAverageStrategy) -> None:
-    """Helper function to visualize signals for debugging"""
+@pytest.fixture(scope='module')
+def downtrend_data():
+    return generate_trend_data(2000, 20, 'down')
+
+def visualize_signals(market_data: Union[pd.DataFrame, List[Dict]], strategy: SimpleMovingAverageStrategy) -> None:
+    """Helper function to visualize signals for debugging. Set KRAKEN_DEBUG=1 to enable."""
+    if not os.environ.get('KRAKEN_DEBUG'):
+        return
+    
     df = strategy._calculate_indicators(market_data)
     print("\nSignal Analysis:")
     print(f"Last 5 rows of indicators:")
     print(df[['close', 'short_ma', 'long_ma', 'ma_diff', 'crossover', 'trend']].tail().round(4))
     
-    df = df.dropna()
-    if len(df) > 0:
-        last_row = df.iloc[-1]
+    # Indicators are only NaN for the leading rows, so checking the last row is enough
+    last_row = df.iloc[-1]
+    if not (np.isnan(last_row['ma_diff']) or np.isnan(last_row['trend'])):
         print("\nSignal Conditions:")
         print(f"MA Difference: {last_row['ma_diff']:.4f}")
         print(f"Crossover Signal: {last_row['crossover']:.4f}")
@@ -99,13 +117,11 @@ def visualize_signals(market_data: List[Dict], strategy: SimpleMovingAverageStra
 class TestSimpleMovingAverageStrategy:
     """Test suite for Simple Moving Average Strategy"""
     
-    @pytest.mark.asyncio
-    async def test_signal_generation(self, strategy_config):
+    @pytest.mark.xdist_group('strategy_trend')
+    async def test_signal_generation(self, strategy, uptrend_data, downtrend_data):
         """Test that strategy generates correct signals"""
-        strategy = SimpleMovingAverageStrategy(strategy_config)
         
         # Test buy signal during uptrend
-        uptrend_data = generate_trend_data(1000, 20, 'up')
         signal = await strategy.generate_signals(uptrend_data)
         visualize_signals(uptrend_data, strategy)
         
@@ -115,8 +131,13 @@ class TestSimpleMovingAverageStrategy:
             f"Trend: {signal['trend']:.2%}, Crossover: {signal['crossover']:.2f}"
         )
         
+        assert isinstance(signal, Signal)
+        assert 'stop_loss_price' not in signal  # No position open
+        assert signal.get('stop_loss_price', 0.0) == 0.0
+        with pytest.raises(KeyError):
+            signal['stop_loss_price']
+        
         # Test sell signal during downtrend
-        downtrend_data = generate_trend_data(2000, 20, 'down')
         signal = await strategy.generate_signals(downtrend_data)
         visualize_signals(downtrend_data, strategy)
         
@@ -126,24 +147,135 @@ class TestSimpleMovingAverageStrategy:
             f"Trend: {signal['trend']:.2%}, Crossover: {signal['crossover']:.2f}"
         )
     
-    def test_position_size_calculation(self, strategy_config):
+    def test_sync_signal_generation(self, strategy, uptrend_data, downtrend_data):
+        """Test the synchronous signal path used by backtests"""
+        assert strategy._generate_signals_sync(uptrend_data)['type'] == 'buy'
+        assert strategy._generate_signals_sync(downtrend_data)['type'] == 'sell'
+    
+    async def test_signal_generation_from_frame(self, strategy):
+        """Test that DataFrame and column array candles give the same signal as candle dicts"""
+        
+        uptrend_data = generate_trend_data(1000, 20, 'up', as_frame=False)
+        frame = pd.DataFrame(uptrend_data)
+        
+        list_signal = await strategy.generate_signals(uptrend_data)
+        frame_signal = await strategy.generate_signals(frame)
+        
+        assert frame_signal['type'] == list_signal['type']
+        assert frame_signal['short_ma'] == pytest.approx(list_signal['short_ma'])
+        assert type(frame_signal['timestamp']) is int
+        assert list(frame.columns) == ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+        
+        arrays = {column: frame[column].to_numpy() for column in frame.columns}
+        arrays_signal = await strategy.generate_signals(arrays)
+        assert arrays_signal['type'] == list_signal['type']
+        assert arrays_signal['short_ma'] == pytest.approx(list_signal['short_ma'])
+    
+    async def test_incremental_indicators_match_full_recompute(self, strategy, rng):
+        """Test that tick-by-tick indicator updates agree with a full recomputation"""
+        market_data = generate_trend_data(1000, 30, 'up', as_frame=False, rng=rng) + [
+            dict(candle, timestamp=candle['timestamp'] + 30 * 3600 * 1000)
+            for candle in generate_trend_data(1800, 30, 'down', as_frame=False, rng=rng)
+        ]
+        
+        for end in range(strategy.long_window + 1, len(market_data) + 1):
+            window = market_data[:end]
+            if end % 7 == 0:
+                # Revise the in-progress candle before the next one arrives
+                window = window[:-1] + [dict(window[-1], close=window[-1]['close'] * 1.01)]
+            signal = await strategy.generate_signals(window)
+            expected = strategy._calculate_indicators(window).iloc[-1]
+            
+            assert signal['short_ma'] == pytest.approx(expected['short_ma'])
+            assert signal['long_ma'] == pytest.approx(expected['long_ma'])
+            assert signal['trend'] == pytest.approx(expected['trend'])
+            assert signal['crossover'] == expected['crossover']
+            
+            snapshot = strategy._indicator_snapshot(window)
+            assert snapshot.ma_diff == pytest.approx(expected['ma_diff'])
+            assert snapshot.trend == pytest.approx(expected['trend'])
+            assert snapshot.crossover == expected['crossover']
+            assert snapshot.signal == strategy._classify_signal(
+                expected['crossover'], expected['trend'], expected['ma_diff']
+            )
+            assert strategy._indicator_snapshot(window) is snapshot
+            assert strategy._calculate_indicators(window) is strategy._calculate_indicators(window)
+    
+    def test_indicators_replace_existing_columns(self, strategy, rng):
+        """Test that recalculating indicators on their own output doesn't duplicate columns"""
+        df = strategy._calculate_indicators(generate_trend_data(1000, 30, 'up', rng=rng))
+        
+        recalculated = strategy._calculate_indicators(df.copy())
+        
+        assert list(recalculated.columns) == list(df.columns)
+        pd.testing.assert_frame_equal(recalculated, df)
+    
+    def test_batch_signals_match_per_candle_signals(self, strategy, rng):
+        """Test that batch signal codes agree with evaluating each candle in turn"""
+        market_data = generate_trend_data(1000, 30, 'up', as_frame=False, rng=rng) + [
+            dict(candle, timestamp=candle['timestamp'] + 30 * 3600 * 1000)
+            for candle in generate_trend_data(1800, 30, 'down', as_frame=False, rng=rng)
+        ]
+        
+        signals = strategy.generate_signals_batch(market_data)
+        
+        assert signals.dtype == np.int8
+        assert len(signals) == len(market_data)
+        codes = {'buy': 1, 'sell': -1, 'hold': 0}
+        for end in range(1, len(market_data) + 1):
+            expected = strategy._detect_signal(strategy._indicator_snapshot(market_data[:end]))
+            assert signals[end - 1] == codes[expected]
+    
+    def test_numpy_kernel_matches_compiled_kernel(self, rng):
+        """Test that the no-Numba indicator fallback gives the same results"""
+        close = np.concatenate([
+            generate_trend_data(1000, 30, 'up', rng=rng)['close'].to_numpy(),
+            generate_trend_data(1800, 30, 'down', rng=rng)['close'].to_numpy()
+        ])
+        
+        actual = tuple(np.empty(len(close)) for _ in range(5))
+        sma_kernel_numpy(close, 5, 10, *actual)
+        for expected_col, actual_col in zip(sma_indicators(close, 5, 10), actual):
+            np.testing.assert_allclose(actual_col, expected_col, rtol=1e-9)
+    
+    def test_sma_cumsum_dtypes(self):
+        """Test that float32 prices keep their dtype and integer prices give float64 averages"""
+        expected = np.array([np.nan, np.nan, 2.0, 3.0, 4.0])
+        
+        sma32 = sma_cumsum(np.arange(1, 6, dtype=np.float32), 3)
+        assert sma32.dtype == np.float32
+        np.testing.assert_allclose(sma32, expected)
+        
+        sma_int = sma_cumsum(np.arange(1, 6, dtype=np.int64), 3)
+        assert sma_int.dtype == np.float64
+        np.testing.assert_allclose(sma_int, expected)
+    
+    def test_signal_grid_performance(self, rng):
+        """Test the parallel window sweep against per-window moving averages on a long history"""
+        close = 1000.0 + rng.normal(0.0, 1.0, size=20_000).cumsum()
+        windows = np.arange(5, 105, 5, dtype=np.int64)
+        out = np.empty((len(close), len(windows)), order='F')
+        
+        sma_grid(close, windows, out)
+        
+        for j, window in enumerate(windows):
+            np.testing.assert_allclose(out[:, j], sma_cumsum(close, window), rtol=1e-9)
+    
+    def test_position_size_calculation(self, strategy):
         """Test position sizing logic"""
-        strategy = SimpleMovingAverageStrategy(strategy_config)
         signal = {'timestamp': 1000000, 'type': 'buy', 'price': 1000.0}
         
         balance = 10000.0
         position_size = strategy.calculate_position_size(signal, balance)
         expected_size = (balance * 0.1) / signal['price']
-        assert position_size == pytest.approx(expected_size)
+        assert isclose(position_size, expected_size, rel_tol=1e-9)
         
         signal['type'] = 'sell'
         position_size = strategy.calculate_position_size(signal, balance)
         assert position_size == 0.0
     
-    def test_risk_metrics(self, strategy_config):
+    def test_risk_metrics(self, strategy):
         """Test risk metrics calculation"""
-        strategy = SimpleMovingAverageStrategy(strategy_config)
-        
         # Test position entry
         entry_order = {
             'side': 'buy',
@@ -165,18 +297,22 @@ class TestSimpleMovingAverageStrategy:
         
         metrics = strategy.calculate_risk_metrics(current_data)
         assert metrics['unrealized_pnl'] == 100.0
-        assert metrics['pnl_percentage'] == pytest.approx(10.0)
+        assert isclose(metrics['pnl_percentage'], 10.0, rel_tol=1e-9)
         
         # Test loss scenario
         current_data[0]['close'] = 900.0
         metrics = strategy.calculate_risk_metrics(current_data)
         assert metrics['unrealized_pnl'] == -100.0
-        assert metrics['pnl_percentage'] == pytest.approx(-10.0)
+        assert isclose(metrics['pnl_percentage'], -10.0, rel_tol=1e-9)
+        
+        # Close prices as an array
+        metrics = strategy.calculate_risk_metrics(np.array([1000.0, 1050.0]))
+        assert metrics['unrealized_pnl'] == 50.0
+        assert isclose(metrics['pnl_percentage'], 5.0, rel_tol=1e-9)
     
-    @pytest.mark.asyncio
-    async def test_exit_signals(self, strategy_config):
+    @pytest.mark.xdist_group('strategy_trend')
+    async def test_exit_signals(self, strategy, uptrend_data, downtrend_data):
         """Test exit signal generation"""
-        strategy = SimpleMovingAverageStrategy(strategy_config)
         strategy.update_position({
             'side': 'buy',
             'price': 1000.0,
@@ -185,13 +321,39 @@ class TestSimpleMovingAverageStrategy:
         })
         
         # Test no exit during uptrend
-        uptrend_data = generate_trend_data(1000, 20, 'up')
         should_exit = strategy.should_exit(uptrend_data)
         visualize_signals(uptrend_data, strategy)
         assert not should_exit, "Should not exit during uptrend"
         
         # Test exit during downtrend
-        downtrend_data = generate_trend_data(2000, 20, 'down')
         should_exit = strategy.should_exit(downtrend_data)
         visualize_signals(downtrend_data, strategy)
-        assert should_exit, "Should exit during downtrend"
\ No newline at end of file
+        assert should_exit, "Should exit during downtrend"
+        
+        # Exit check after generate_signals on the same candle reuses its signal
+        signal = await strategy.generate_signals(uptrend_data)
+        assert signal['type'] == 'buy'
+        assert not strategy.should_exit(uptrend_data), "Should not exit on a cached buy signal"
+    
+    async def test_stop_loss_update_shared_per_tick(self, strategy):
+        """Test that should_exit and generate_signals share one stop loss update per price"""
+        strategy.update_position({
+            'side': 'buy',
+            'price': 1000.0,
+            'amount': 1.0,
+            'datetime': '2024-01-01T00:00:00'
+        })
+        uptrend_data = generate_trend_data(1000, 20, 'up', as_frame=False)
+        next_candle = dict(uptrend_data[-1], timestamp=uptrend_data[-1]['timestamp'] + 3600 * 1000,
+                           close=uptrend_data[-1]['close'] * 1.01)
+        
+        with patch.object(strategy.stop_loss_manager, 'update',
+                          wraps=strategy.stop_loss_manager.update) as update:
+            strategy.should_exit(uptrend_data)
+            signal = await strategy.generate_signals(uptrend_data)
+            assert update.call_count == 1
+            
+            strategy.should_exit(uptrend_data + [next_candle])
+            assert update.call_count == 2
+        
+        assert signal['highest_price'] == pytest.approx(uptrend_data[-1]['close'])
\ No newline at end of file